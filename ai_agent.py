@@ -1,10 +1,144 @@
-import streamlit as st
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 import json
+import copy
+import functools
+import hashlib
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+def _dumps_report(report: Dict) -> bytes:
+    """Serialize an export report as indented UTF-8 JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(
+            report, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+        )
+    return json.dumps(report, indent=2, default=str).encode("utf-8")
+
+def _skewness_from_deviations(dev: np.ndarray) -> float:
+    """Bias-corrected sample skewness from deviations about the mean (matches ``pd.Series.skew``)."""
+    n = dev.size
+    if n < 3:
+        return float("nan")
+    sq = dev * dev
+    m2 = sq.sum() / n
+    if m2 == 0:
+        return 0.0
+    m3 = np.dot(sq, dev) / n
+    return float(np.sqrt(n * (n - 1)) / (n - 2) * m3 / m2 ** 1.5)
+
+def _skewness(arr: np.ndarray) -> float:
+    """Bias-corrected sample skewness of a NaN-free float64 array."""
+    return _skewness_from_deviations(arr - arr.mean())
+
+def _quality_stats(arr: np.ndarray) -> Tuple[float, float]:
+    """Return (outlier_ratio, skewness) of a NaN-free float64 array.
+    
+    The IQR outlier count and the moments share a single deviation array, so the
+    data is only materialised once beyond the quartile selection.
+    """
+    q1, q3 = np.quantile(arr, (0.25, 0.75), method="linear")
+    iqr = q3 - q1
+    mean = arr.mean()
+    dev = arr - mean
+    lo = q1 - 1.5 * iqr - mean
+    hi = q3 + 1.5 * iqr - mean
+    outlier_count = int(np.count_nonzero((dev < lo) | (dev > hi)))
+    return outlier_count / arr.size, _skewness_from_deviations(dev)
+
+@functools.lru_cache(maxsize=128)
+def _parameter_recommendations(data_size: int, highly_skewed: bool, skewness_label: str, n_criteria: int) -> Dict:
+    """Recommendation payload for a dataset summary; the key space is tiny, so results are memoized."""
+    recommendations = {
+        "workflow_recommendation": "",
+        "step_sizes": {},
+        "distribution_method": "",
+        "correlation_range": (0.1, 0.9),
+        "simulation_settings": {},
+        "reasoning": []
+    }
+    
+    # Workflow recommendation
+    if data_size > 2000:
+        recommendations["workflow_recommendation"] = "3-step workflow"
+        recommendations["reasoning"].append("Large dataset (>2000 clones) - 3-step workflow provides better selection")
+    elif data_size > 1000:
+        recommendations["workflow_recommendation"] = "2-step workflow"
+        recommendations["reasoning"].append("Medium dataset (1000-2000 clones) - 2-step workflow is efficient")
+    else:
+        recommendations["workflow_recommendation"] = "2-step workflow"
+        recommendations["reasoning"].append("Small dataset (<1000 clones) - 2-step workflow recommended")
+    
+    # Step size recommendations
+    if data_size > 2000:
+        recommendations["step_sizes"] = {
+            "step1_keep": min(192, data_size // 10),
+            "step2_keep": min(96, data_size // 20),
+            "step3_keep": 6
+        }
+    elif data_size > 1000:
+        recommendations["step_sizes"] = {
+            "step1_keep": min(96, data_size // 10),
+            "step2_keep": min(48, data_size // 20),
+            "step3_keep": 6
+        }
+    else:
+        recommendations["step_sizes"] = {
+            "step1_keep": min(48, data_size // 5),
+            "step2_keep": min(24, data_size // 10),
+            "step3_keep": 6
+        }
+    
+    # Distribution method recommendation
+    if highly_skewed:
+        recommendations["distribution_method"] = "kde"
+        recommendations["reasoning"].append(f"Highly skewed data (skewness={skewness_label}) - KDE recommended")
+    else:
+        recommendations["distribution_method"] = "lognormal"
+        recommendations["reasoning"].append(f"Moderate skewness (skewness={skewness_label}) - Lognormal suitable")
+    
+    # Simulation settings
+    if data_size > 2000:
+        recommendations["simulation_settings"] = {
+            "n_rep": 5000,
+            "correlation_step_size": 0.05
+        }
+    else:
+        recommendations["simulation_settings"] = {
+            "n_rep": 10000,
+            "correlation_step_size": 0.01
+        }
+    
+    # Criteria recommendations
+    if n_criteria:
+        recommendations["reasoning"].append(f"Criteria columns detected: {n_criteria} - consider using filtering")
+    
+    return recommendations
+
+def _results_fingerprint(arr: np.ndarray, n_rows: int) -> str:
+    """Content hash of a contiguous Results array plus the frame length it came from."""
+    digest = hashlib.blake2b(np.ascontiguousarray(arr), digest_size=16).hexdigest()
+    return f"{n_rows}:{digest}"
+
+def _summarize_context(context: Dict) -> Dict:
+    """Shallow metadata for a chat context, so history never pins large objects."""
+    summary = {}
+    for key, value in context.items():
+        if isinstance(value, pd.DataFrame):
+            summary[key] = {"n_rows": len(value), "n_cols": len(value.columns)}
+        elif isinstance(value, (list, tuple, np.ndarray)):
+            summary[key] = {"length": len(value)}
+        elif isinstance(value, dict):
+            summary[key] = {"keys": list(value)}
+        else:
+            summary[key] = value
+    return summary
+
 class CLDAIAgent:
     """
     AI Agent for CLD Clone Selection Dashboard
@@ -12,10 +146,33 @@ class CLDAIAgent:
     """
     
     def __init__(self):
-        self.conversation_history = []
+        # Conversation history stored column-wise; rows are only assembled on export
+        self._history_timestamps: List[str] = []
+        self._history_messages: List[str] = []
+        self._history_contexts: List[Dict] = []
         self.analysis_cache = {}
         self.recommendation_rules = self._load_recommendation_rules()
+        self._bind_thresholds()
+        # Keyword -> handler(message_lower, context), checked in priority order
+        self._intent_table = {
+            "help": self._generate_help_response,
+            "how": self._generate_help_response,
+            "optimize": lambda message, context: self._generate_optimization_response(context),
+            "improve": lambda message, context: self._generate_optimization_response(context),
+            "explain": self._generate_explanation_response,
+            "what": self._generate_explanation_response,
+            "recommend": lambda message, context: self._generate_recommendation_response(context),
+            "suggest": lambda message, context: self._generate_recommendation_response(context),
+        }
         
+    @property
+    def conversation_history(self) -> List[Dict]:
+        """Conversation history as a list of ``{"timestamp", "user", "context"}`` records."""
+        return [
+            {"timestamp": ts, "user": msg, "context": ctx}
+            for ts, msg, ctx in zip(self._history_timestamps, self._history_messages, self._history_contexts)
+        ]
+    
     def _load_recommendation_rules(self) -> Dict:
         """Load AI recommendation rules and thresholds."""
         return {
@@ -42,6 +199,19 @@ class CLDAIAgent:
             }
         }
     
+    def _bind_thresholds(self):
+        """Bind the scalar thresholds from ``recommendation_rules`` as attributes."""
+        rules = self.recommendation_rules
+        self._perf_excellent = rules["performance_thresholds"]["excellent"]
+        self._perf_good = rules["performance_thresholds"]["good"]
+        self._perf_fair = rules["performance_thresholds"]["fair"]
+        self._sens_high = rules["sensitivity_thresholds"]["high"]
+        self._sens_medium = rules["sensitivity_thresholds"]["medium"]
+        self._corr_high = rules["correlation_thresholds"]["high"]
+        self._corr_medium = rules["correlation_thresholds"]["medium"]
+        self._outlier_threshold = rules["data_quality_thresholds"]["outlier_threshold"]
+        self._skewness_threshold = rules["data_quality_thresholds"]["skewness_threshold"]
+    
     def analyze_data_quality(self, df: pd.DataFrame) -> Dict:
         """Analyze data quality and provide AI insights."""
         analysis = {
@@ -57,31 +227,33 @@ class CLDAIAgent:
             analysis["issues"].append("Missing required 'Results' column")
             return analysis
         
-        results = df["Results"].dropna()
+        arr = df["Results"].to_numpy(dtype=np.float64, copy=False)
+        arr = arr[~np.isnan(arr)]
+        
+        # Reruns on an unchanged dataset reuse the previous analysis
+        cache_key = f"data_quality:{_results_fingerprint(arr, len(df))}"
+        if cache_key in self.analysis_cache:
+            return copy.deepcopy(self.analysis_cache[cache_key])
         
         # Data completeness
-        completeness = len(results) / len(df)
+        completeness = arr.size / len(df)
         if completeness < 0.9:
             analysis["issues"].append(f"Low data completeness: {completeness:.1%}")
             analysis["recommendations"].append("Consider cleaning data to remove missing values")
         else:
             analysis["strengths"].append(f"Good data completeness: {completeness:.1%}")
         
-        # Outlier detection
-        Q1, Q3 = results.quantile([0.25, 0.75])
-        IQR = Q3 - Q1
-        outliers = results[(results < Q1 - 1.5 * IQR) | (results > Q3 + 1.5 * IQR)]
-        outlier_ratio = len(outliers) / len(results)
+        # Outlier detection and distribution moments in one fused pass
+        outlier_ratio, skewness = _quality_stats(arr)
         
-        if outlier_ratio > self.recommendation_rules["data_quality_thresholds"]["outlier_threshold"]:
+        if outlier_ratio > self._outlier_threshold:
             analysis["warnings"].append(f"High outlier ratio: {outlier_ratio:.1%}")
             analysis["recommendations"].append("Review outliers for biological relevance")
         else:
             analysis["strengths"].append(f"Low outlier ratio: {outlier_ratio:.1%}")
         
         # Distribution analysis
-        skewness = results.skew()
-        if abs(skewness) > self.recommendation_rules["data_quality_thresholds"]["skewness_threshold"]:
+        if abs(skewness) > self._skewness_threshold:
             analysis["warnings"].append(f"Highly skewed distribution: {skewness:.2f}")
             analysis["recommendations"].append("Consider using KDE instead of lognormal distribution")
         else:
@@ -90,6 +262,7 @@ class CLDAIAgent:
         # Calculate quality score
         analysis["quality_score"] = min(1.0, completeness * (1 - outlier_ratio) * (1 - abs(skewness) / 5))
         
+        self.analysis_cache[cache_key] = copy.deepcopy(analysis)
         return analysis
     
     def analyze_simulation_results(self, results: Dict) -> Dict:
@@ -105,26 +278,26 @@ class CLDAIAgent:
         if "probabilities" not in results:
             return analysis
         
-        probabilities = results["probabilities"]
-        correlations = results["correlations"]
+        probs = np.ascontiguousarray(results["probabilities"], dtype=np.float64)
+        corrs = np.ascontiguousarray(results["correlations"], dtype=np.float64)
         
         # Performance analysis
-        max_prob = max(probabilities)
-        min_prob = min(probabilities)
-        avg_prob = np.mean(probabilities)
-        optimal_corr = correlations[np.argmax(probabilities)]
+        best_idx = int(probs.argmax())
+        max_prob = float(probs[best_idx])
+        min_prob = float(probs.min())
+        avg_prob = float(probs.mean())
+        optimal_corr = float(corrs[best_idx])
         
         # Determine performance level
-        thresholds = self.recommendation_rules["performance_thresholds"]
-        if max_prob >= thresholds["excellent"]:
+        if max_prob >= self._perf_excellent:
             analysis["performance_level"] = "excellent"
             analysis["key_insights"].append(f"Outstanding performance: {max_prob:.1%} success rate")
             analysis["recommendations"].append("Current parameters are optimal - consider resource optimization")
-        elif max_prob >= thresholds["good"]:
+        elif max_prob >= self._perf_good:
             analysis["performance_level"] = "good"
             analysis["key_insights"].append(f"Good performance: {max_prob:.1%} success rate")
             analysis["optimization_opportunities"].append("Room for improvement through parameter optimization")
-        elif max_prob >= thresholds["fair"]:
+        elif max_prob >= self._perf_fair:
             analysis["performance_level"] = "fair"
             analysis["key_insights"].append(f"Fair performance: {max_prob:.1%} success rate")
             analysis["optimization_opportunities"].append("Significant optimization opportunities available")
@@ -134,10 +307,10 @@ class CLDAIAgent:
             analysis["risk_assessments"].append("Major parameter review required")
         
         # Correlation analysis
-        if optimal_corr > self.recommendation_rules["correlation_thresholds"]["high"]:
+        if optimal_corr > self._corr_high:
             analysis["key_insights"].append(f"High optimal correlation ({optimal_corr:.2f}) - strong assay consistency beneficial")
             analysis["recommendations"].append("Invest in improving assay correlation for better results")
-        elif optimal_corr > self.recommendation_rules["correlation_thresholds"]["medium"]:
+        elif optimal_corr > self._corr_medium:
             analysis["key_insights"].append(f"Moderate optimal correlation ({optimal_corr:.2f}) - reasonable assay consistency")
         else:
             analysis["key_insights"].append(f"Low optimal correlation ({optimal_corr:.2f}) - correlation less critical")
@@ -155,77 +328,17 @@ class CLDAIAgent:
     
     def generate_parameter_recommendations(self, df: pd.DataFrame, current_settings: Dict) -> Dict:
         """Generate intelligent parameter recommendations based on data characteristics."""
-        recommendations = {
-            "workflow_recommendation": "",
-            "step_sizes": {},
-            "distribution_method": "",
-            "correlation_range": (0.1, 0.9),
-            "simulation_settings": {},
-            "reasoning": []
-        }
-        
         # Analyze data characteristics
-        results = df["Results"].dropna()
-        data_size = len(results)
-        skewness = results.skew()
-        criteria_columns = [col for col in df.columns if col.lower().startswith("criteria")]
-        
-        # Workflow recommendation
-        if data_size > 2000:
-            recommendations["workflow_recommendation"] = "3-step workflow"
-            recommendations["reasoning"].append("Large dataset (>2000 clones) - 3-step workflow provides better selection")
-        elif data_size > 1000:
-            recommendations["workflow_recommendation"] = "2-step workflow"
-            recommendations["reasoning"].append("Medium dataset (1000-2000 clones) - 2-step workflow is efficient")
-        else:
-            recommendations["workflow_recommendation"] = "2-step workflow"
-            recommendations["reasoning"].append("Small dataset (<1000 clones) - 2-step workflow recommended")
-        
-        # Step size recommendations
-        if data_size > 2000:
-            recommendations["step_sizes"] = {
-                "step1_keep": min(192, data_size // 10),
-                "step2_keep": min(96, data_size // 20),
-                "step3_keep": 6
-            }
-        elif data_size > 1000:
-            recommendations["step_sizes"] = {
-                "step1_keep": min(96, data_size // 10),
-                "step2_keep": min(48, data_size // 20),
-                "step3_keep": 6
-            }
-        else:
-            recommendations["step_sizes"] = {
-                "step1_keep": min(48, data_size // 5),
-                "step2_keep": min(24, data_size // 10),
-                "step3_keep": 6
-            }
-        
-        # Distribution method recommendation
-        if abs(skewness) > 2:
-            recommendations["distribution_method"] = "kde"
-            recommendations["reasoning"].append(f"Highly skewed data (skewness={skewness:.2f}) - KDE recommended")
-        else:
-            recommendations["distribution_method"] = "lognormal"
-            recommendations["reasoning"].append(f"Moderate skewness (skewness={skewness:.2f}) - Lognormal suitable")
-        
-        # Simulation settings
-        if data_size > 2000:
-            recommendations["simulation_settings"] = {
-                "n_rep": 5000,
-                "correlation_step_size": 0.05
-            }
-        else:
-            recommendations["simulation_settings"] = {
-                "n_rep": 10000,
-                "correlation_step_size": 0.01
-            }
-        
-        # Criteria recommendations
-        if criteria_columns:
-            recommendations["reasoning"].append(f"Criteria columns detected: {len(criteria_columns)} - consider using filtering")
-        
-        return recommendations
+        arr = df["Results"].to_numpy(dtype=np.float64, copy=False)
+        arr = arr[~np.isnan(arr)]
+        skewness = _skewness(arr)
+        criteria_mask = df.columns.astype(str).str.lower().str.startswith("criteria")
+        
+        recommendations = _parameter_recommendations(
+            int(arr.size), bool(abs(skewness) > 2), f"{skewness:.2f}", int(criteria_mask.sum())
+        )
+        # The memoized dict is shared between calls; hand out a private copy
+        return copy.deepcopy(recommendations)
     
     def analyze_sensitivity_results(self, sensitivity_results: Dict) -> Dict:
         """Analyze sensitivity analysis results and provide AI insights."""
@@ -236,20 +349,29 @@ class CLDAIAgent:
             "insights": []
         }
         
-        for param_name, data in sensitivity_results.items():
-            values = data['values']
-            probabilities = data['probabilities']
-            
-            # Calculate sensitivity
-            max_prob = max(probabilities)
-            min_prob = min(probabilities)
-            sensitivity = max_prob - min_prob
-            
-            # Categorize parameter sensitivity
-            if sensitivity > self.recommendation_rules["sensitivity_thresholds"]["high"]:
+        param_names = list(sensitivity_results)
+        if not param_names:
+            return analysis
+        
+        # Calculate sensitivity (max - min) for every parameter at once
+        prob_arrays = [np.asarray(sensitivity_results[name]['probabilities'], dtype=np.float64)
+                       for name in param_names]
+        if len({len(p) for p in prob_arrays}) == 1:
+            sensitivities = np.ptp(np.stack(prob_arrays), axis=1)
+        else:
+            sensitivities = np.array([np.ptp(p) for p in prob_arrays])
+        
+        high_mask = sensitivities > self._sens_high
+        medium_mask = sensitivities > self._sens_medium
+        
+        # Categorize parameter sensitivity
+        for param_name, sensitivity, is_high, is_medium in zip(
+            param_names, sensitivities.tolist(), high_mask.tolist(), medium_mask.tolist()
+        ):
+            if is_high:
                 analysis["critical_parameters"].append(param_name)
                 analysis["optimization_priorities"].append(f"High priority: {param_name} (sensitivity: {sensitivity:.1%})")
-            elif sensitivity > self.recommendation_rules["sensitivity_thresholds"]["medium"]:
+            elif is_medium:
                 analysis["insights"].append(f"Moderate sensitivity: {param_name} (sensitivity: {sensitivity:.1%})")
             else:
                 analysis["stable_parameters"].append(param_name)
@@ -269,7 +391,7 @@ class CLDAIAgent:
         
         # Analyze current performance
         if "probabilities" in current_results:
-            max_prob = max(current_results["probabilities"])
+            max_prob = float(np.max(current_results["probabilities"]))
             
             if max_prob < 0.4:
                 plan["immediate_actions"].append("Review all workflow parameters - current performance is poor")
@@ -287,7 +409,7 @@ class CLDAIAgent:
         if sensitivity_results:
             critical_params = []
             for param_name, data in sensitivity_results.items():
-                sensitivity = max(data['probabilities']) - min(data['probabilities'])
+                sensitivity = float(np.ptp(data['probabilities']))
                 if sensitivity > 0.2:
                     critical_params.append(param_name)
             
@@ -299,33 +421,25 @@ class CLDAIAgent:
     def chat_interface(self, user_message: str, context: Dict) -> str:
         """Interactive chat interface for user queries."""
         # Add to conversation history
-        self.conversation_history.append({
-            "timestamp": datetime.now().isoformat(),
-            "user": user_message,
-            "context": context
-        })
+        self._history_timestamps.append(datetime.now().isoformat())
+        self._history_messages.append(user_message)
+        self._history_contexts.append(_summarize_context(context))
         
         # Simple rule-based responses (can be enhanced with LLM integration)
         user_message_lower = user_message.lower()
         
-        if "help" in user_message_lower or "how" in user_message_lower:
-            return self._generate_help_response(user_message, context)
-        elif "optimize" in user_message_lower or "improve" in user_message_lower:
-            return self._generate_optimization_response(context)
-        elif "explain" in user_message_lower or "what" in user_message_lower:
-            return self._generate_explanation_response(user_message, context)
-        elif "recommend" in user_message_lower or "suggest" in user_message_lower:
-            return self._generate_recommendation_response(context)
-        else:
-            return self._generate_general_response(user_message, context)
+        for keyword, handler in self._intent_table.items():
+            if keyword in user_message_lower:
+                return handler(user_message_lower, context)
+        return self._generate_general_response(user_message, context)
     
     def _generate_help_response(self, message: str, context: Dict) -> str:
-        """Generate help response based on user query."""
-        if "correlation" in message.lower():
+        """Generate help response based on an already-lowercased user query."""
+        if "correlation" in message:
             return "Correlation measures the relationship between assay steps. Higher correlation means more consistent results between steps. Use sensitivity analysis to find the optimal correlation for your data."
-        elif "sensitivity" in message.lower():
+        elif "sensitivity" in message:
             return "Sensitivity analysis shows how much each parameter affects success probability. Focus optimization on high-sensitivity parameters for maximum impact."
-        elif "workflow" in message.lower():
+        elif "workflow" in message:
             return "2-step workflows are simpler and faster, while 3-step workflows provide more selection stages. Choose based on your data size and resource constraints."
         else:
             return "I can help you with parameter optimization, result interpretation, workflow selection, and data analysis. What specific aspect would you like to know more about?"
@@ -344,10 +458,10 @@ class CLDAIAgent:
             return "Run a simulation first to get optimization recommendations based on your specific data and parameters."
     
     def _generate_explanation_response(self, message: str, context: Dict) -> str:
-        """Generate explanation response."""
-        if "success probability" in message.lower():
+        """Generate explanation response for an already-lowercased user query."""
+        if "success probability" in message:
             return "Success probability is the likelihood that ALL final selected clones are in the top X% of performers. Higher values indicate better selection quality."
-        elif "correlation" in message.lower():
+        elif "correlation" in message:
             return "Correlation between 0-1 measures assay consistency. 0.7+ means strong consistency, 0.5 means moderate, <0.3 means weak consistency."
         else:
             return "I can explain any aspect of the simulation, results, or parameters. What would you like me to clarify?"
@@ -365,18 +479,20 @@ class CLDAIAgent:
         """Generate general response for unrecognized queries."""
         return "I'm here to help with your CLD clone selection analysis. You can ask me about: parameter optimization, result interpretation, workflow recommendations, data analysis, or any other aspect of the dashboard. What would you like to know?"
     
-    def export_ai_analysis(self) -> str:
-        """Export AI analysis as a comprehensive report."""
+    def export_ai_analysis(self) -> bytes:
+        """Export AI analysis as a comprehensive report (UTF-8 encoded JSON)."""
         report = {
             "timestamp": datetime.now().isoformat(),
             "conversation_history": self.conversation_history,
             "analysis_cache": self.analysis_cache,
             "summary": "AI Agent Analysis Report"
         }
-        return json.dumps(report, indent=2)
+        return _dumps_report(report)
 
 def create_ai_agent_interface():
     """Create the AI agent interface in Streamlit."""
+    import streamlit as st
+    
     st.markdown("## 🤖 AI Agent Assistant")
     
     # Initialize AI agent
@@ -1,20 +1,10 @@
+import io
 import streamlit as st
 import pandas as pd
 import numpy as np
+from streamlit.dataframe_util import convert_pandas_df_to_arrow_table
 from loader import load_data
 from sidebar import configure_sidebar
-from plots import (
-    plot_criteria_distributions, 
-    plot_distribution_comparison, 
-    plot_success_prob_vs_corr, 
-    plot_success_histogram,
-    plot_workflow_comparison,
-    plot_sensitivity_analysis,
-    plot_correlation_heatmap,
-    plot_clone_selection_flow
-)
-from simulation import simulate_workflow, generate_samples, fit_lognormal, run_sensitivity_analysis
-from ai_agent import create_ai_agent_interface
 
 # Page configuration
 st.set_page_config(
@@ -55,6 +45,31 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_data(show_spinner=False)
+def fit_distribution(results, dist_method):
+    """Fit the sampling distribution once per (results, method); None for KDE."""
+    from simulation import fit_lognormal
+    
+    return fit_lognormal(results) if dist_method == "lognormal" else None
+
+def preview_table(df, n_rows=10):
+    """First ``n_rows`` of ``df`` as an Arrow table for st.dataframe.
+    
+    Uses Streamlit's own conversion, which falls back to strings for columns
+    Arrow can't type (e.g. clone IDs mixing numbers and text).
+    """
+    return convert_pandas_df_to_arrow_table(df.head(n_rows))
+
+def summarize_probabilities(correlations, probabilities):
+    """Max/min/mean success probability and the optimal correlation, computed once per run."""
+    best_idx = int(np.argmax(probabilities))
+    return {
+        "max_prob": float(probabilities[best_idx]),
+        "min_prob": float(probabilities.min()),
+        "avg_prob": float(probabilities.mean()),
+        "optimal_corr": correlations[best_idx]
+    }
+
 def main():
     # Header
     st.markdown('<h1 class="main-header">🧬 CLD Clone Selection Optimization Dashboard</h1>', unsafe_allow_html=True)
@@ -95,6 +110,20 @@ def main():
         """)
         return
     
+    # The plotting and simulation stacks (scipy, plotly) are only
+    # needed once a file is uploaded, so keep them off the landing-page render path
+    from plots import (
+        plot_criteria_distributions, 
+        plot_distribution_comparison, 
+        plot_success_prob_vs_corr, 
+        plot_success_histogram,
+        plot_workflow_comparison,
+        plot_sensitivity_analysis,
+        plot_correlation_heatmap,
+        plot_clone_selection_flow
+    )
+    from simulation import simulate_correlation, run_sensitivity_analysis, run_seeded_tasks
+    
     # Load and process data
     try:
         df, selected_sheet, criteria_columns = load_data(uploaded_file)
@@ -102,20 +131,31 @@ def main():
         # Store data in session state for AI agent
         st.session_state.df = df
         
-        # Display data summary
+        # Display data summary; one notna pass feeds both result metrics
+        valid_mask = df["Results"].notna().to_numpy()
+        total = valid_mask.size
+        valid = int(valid_mask.sum())
+        completeness = valid / total if total else 0.0
+        
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Clones", len(df))
+            st.metric("Total Clones", total)
         with col2:
-            st.metric("Valid Results", len(df["Results"].dropna()))
+            st.metric("Valid Results", valid)
         with col3:
             st.metric("Criteria Columns", len(criteria_columns))
         with col4:
-            st.metric("Data Completeness", f"{df['Results'].notna().mean():.1%}")
+            st.metric("Data Completeness", f"{completeness:.1%}")
         
         # Show data preview
+        # Convert the preview to Arrow once per uploaded file/sheet, not on every rerun
+        preview_key = (uploaded_file.file_id, selected_sheet)
+        if st.session_state.get("preview_key") != preview_key:
+            st.session_state["preview_arrow"] = preview_table(df)
+            st.session_state["preview_key"] = preview_key
+        
         with st.expander("📊 Data Preview", expanded=False):
-            st.dataframe(df.head(10), use_container_width=True)
+            st.dataframe(st.session_state["preview_arrow"], use_container_width=True)
             st.write(f"**Sheet:** {selected_sheet}")
         
         if criteria_columns:
@@ -126,7 +166,22 @@ def main():
             st.error("❌ No 'Results' column found in the selected sheet. Please check your data format.")
             return
         
-        results = df["Results"].dropna().values
+        # Build the simulation arrays once per uploaded file/sheet and reuse them on reruns
+        data_key = (uploaded_file.file_id, selected_sheet)
+        if st.session_state.get("results_key") != data_key:
+            # Contiguous float64 view of the valid results, shared by every tab below
+            results = np.ascontiguousarray(df["Results"].to_numpy(dtype=np.float64, copy=False))
+            st.session_state["results_arr"] = results[~np.isnan(results)]
+            
+            # Criteria columns as contiguous float64 arrays for the simulation engine
+            st.session_state["criteria_arrays"] = {
+                col: np.ascontiguousarray(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+                for col in criteria_columns
+            }
+            st.session_state["results_key"] = data_key
+        
+        results = st.session_state["results_arr"]
+        criteria_arrays = st.session_state["criteria_arrays"]
         
         # Configure simulation parameters
         st.sidebar.markdown("## ⚙️ Simulation Parameters")
@@ -157,37 +212,59 @@ def main():
                         success_data_by_corr = {}
                         last_fitted_model = None
                         
+                        # The fit depends only on the data and method, not on the correlation
+                        fitted_model = fit_distribution(results, settings["dist_method"])
+                        
                         # Progress bar
                         progress_bar = st.progress(0)
                         status_text = st.empty()
                         
-                        for i, rho in enumerate(correlations):
-                            status_text.text(f"Processing correlation {rho:.2f}...")
+                        if settings["use_parallel"]:
+                            # Each correlation is independent; only ship the filtered columns to workers
+                            sim_criteria = {
+                                col: criteria_arrays[col] for col, _, _ in settings["criteria_settings"]
+                            }
+                            outcomes = [None] * len(correlations)
+                            status_text.text(f"Processing {len(correlations)} correlations in parallel...")
                             
-                            prob, last_fitted_model, success_counts = simulate_workflow(
-                                results, df, settings["top_x_percent"], settings["step1_keep"],
-                                settings["step2_keep"], settings["step3_keep"], rho,
-                                settings["n_rep"], settings["dist_method"],
-                                settings["criteria_settings"], settings["apply_criteria_at_step2"],
-                                settings["workflow_steps"]
-                            )
-                            probabilities.append(prob)
-                            success_data_by_corr[rho] = success_counts
+                            tasks = [(results, sim_criteria, settings, rho, fitted_model) for rho in correlations]
+                            completed = run_seeded_tasks(simulate_correlation, tasks, int(settings["random_seed"]))
+                            for done, (i, outcome) in enumerate(completed, start=1):
+                                outcomes[i] = outcome
+                                progress_bar.progress(done / len(correlations))
                             
-                            progress_bar.progress((i + 1) / len(correlations))
+                            for rho, (prob, last_fitted_model, success_counts) in zip(correlations, outcomes):
+                                probabilities.append(prob)
+                                success_data_by_corr[rho] = success_counts
+                        else:
+                            for i, rho in enumerate(correlations):
+                                status_text.text(f"Processing correlation {rho:.2f}...")
+                                
+                                prob, last_fitted_model, success_counts = simulate_correlation(
+                                    results, criteria_arrays, settings, rho, fitted_model
+                                )
+                                probabilities.append(prob)
+                                success_data_by_corr[rho] = success_counts
+                                
+                                progress_bar.progress((i + 1) / len(correlations))
                         
                         status_text.text("Simulation complete!")
                         
                         # Store results in session state
+                        probabilities = np.asarray(probabilities, dtype=np.float64)
+                        correlations = [float(c) for c in correlations]
                         st.session_state.update({
                             "top_x_percent": settings["top_x_percent"],
                             "success_data_by_corr": success_data_by_corr,
                             "probabilities": probabilities,
-                            "correlations": [float(c) for c in correlations],
+                            "probability_summary": summarize_probabilities(correlations, probabilities),
+                            "correlations": correlations,
                             "last_fitted_model": last_fitted_model,
                             "results": results,
                             "step2_keep": settings["step3_keep"],
-                            "settings": settings
+                            "settings": settings,
+                            # The interaction grid belongs to the previous run
+                            "heatmap_data": None
                         })
                         
                         st.success("✅ Simulation completed successfully!")
@@ -209,8 +286,9 @@ def main():
                 st.markdown("### 📊 Simulation Results")
                 
                 # Key metrics
-                max_prob = max(st.session_state["probabilities"])
-                max_corr = st.session_state["correlations"][np.argmax(st.session_state["probabilities"])]
+                summary = st.session_state["probability_summary"]
+                max_prob = summary["max_prob"]
+                max_corr = summary["optimal_corr"]
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
@@ -227,7 +305,8 @@ def main():
                     plot_distribution_comparison(
                         st.session_state["results"],
                         st.session_state["last_fitted_model"],
-                        settings["dist_method"]
+                        settings["dist_method"],
+                        random_seed=int(settings["random_seed"])
                     )
                 
                 if "success_data_by_corr" in st.session_state:
@@ -240,7 +319,8 @@ def main():
             if st.button("🔍 Run Sensitivity Analysis", type="primary"):
                 with st.spinner("Running sensitivity analysis..."):
                     sensitivity_results = run_sensitivity_analysis(
-                        results, df, settings, st.session_state.get("correlations", [0.5])
+                        results, criteria_arrays, settings, st.session_state.get("correlations", [0.5]),
+                        fitted_model=fit_distribution(results, settings["dist_method"])
                     )
                     st.session_state["sensitivity_results"] = sensitivity_results
                     plot_sensitivity_analysis(sensitivity_results)
@@ -259,20 +339,17 @@ def main():
                     settings_2step["workflow_steps"] = 2
                     settings_2step["step3_keep"] = settings_2step["step2_keep"]
                     
-                    prob_2step, _, _ = simulate_workflow(
-                        results, df, settings["top_x_percent"], settings["step1_keep"],
-                        settings["step2_keep"], settings["step2_keep"], 0.5,
-                        settings["n_rep"], settings["dist_method"],
-                        settings["criteria_settings"], settings["apply_criteria_at_step2"], 2
-                    )
+                    fitted_model = fit_distribution(results, settings["dist_method"])
+                    prob_2step, _, _ = simulate_correlation(results, criteria_arrays, settings_2step, 0.5, fitted_model)
                     
-                    # 3-step workflow
-                    prob_3step, _, _ = simulate_workflow(
-                        results, df, settings["top_x_percent"], settings["step1_keep"],
-                        settings["step2_keep"], settings["step3_keep"], 0.5,
-                        settings["n_rep"], settings["dist_method"],
-                        settings["criteria_settings"], settings["apply_criteria_at_step2"], 3
-                    )
+                    # 3-step workflow; when step 3 keeps every step-2 clone it selects the
+                    # same final set as the 2-step workflow, so reuse that result
+                    if settings["step3_keep"] == settings["step2_keep"]:
+                        prob_3step = prob_2step
+                    else:
+                        settings_3step = settings.copy()
+                        settings_3step["workflow_steps"] = 3
+                        prob_3step, _, _ = simulate_correlation(results, criteria_arrays, settings_3step, 0.5, fitted_model)
                     
                     workflow_comparison = {
                         "2-step": prob_2step,
@@ -286,11 +363,67 @@ def main():
             st.markdown("### 📈 Advanced Visualizations")
             
             if "probabilities" in st.session_state:
+                if st.button("🗺️ Compute Interaction Heatmap", type="primary"):
+                    with st.spinner("Computing step 1 keep x correlation grid..."):
+                        # Rerun the last simulation's sweep with step 1 keep 20% below and
+                        # above its setting; the middle row is the sweep already stored
+                        run_settings = st.session_state["settings"]
+                        run_correlations = st.session_state["correlations"]
+                        base_keep = run_settings["step1_keep"]
+                        fitted_model = fit_distribution(results, run_settings["dist_method"])
+                        
+                        # Clamp the scaled keeps to what the workflow accepts; a row that
+                        # collapses onto the current setting is skipped
+                        step1_values = [base_keep] * 3
+                        rows = []
+                        for row, scale in ((0, 0.8), (2, 1.2)):
+                            keep = min(max(int(base_keep * scale), run_settings["step2_keep"]), len(results))
+                            if keep == base_keep:
+                                st.warning(
+                                    f"Skipped the {scale:.0%} step 1 keep row: no valid step 1 keep "
+                                    f"{'below' if scale < 1 else 'above'} {base_keep} for this data."
+                                )
+                            else:
+                                step1_values[row] = keep
+                                rows.append(row)
+                        
+                        heatmap_data = np.full((len(step1_values), len(run_correlations)), np.nan)
+                        heatmap_data[1] = st.session_state["probabilities"]
+                        cells = [(row, j) for row in rows for j in range(len(run_correlations))]
+                        progress_bar = st.progress(0)
+                        
+                        if run_settings["use_parallel"]:
+                            sim_criteria = {
+                                col: criteria_arrays[col] for col, _, _ in run_settings["criteria_settings"]
+                            }
+                            tasks = [
+                                (results, sim_criteria, dict(run_settings, step1_keep=step1_values[row]),
+                                 run_correlations[j], fitted_model)
+                                for row, j in cells
+                            ]
+                            completed = run_seeded_tasks(simulate_correlation, tasks, int(run_settings["random_seed"]))
+                            for done, (i, (prob, _, _)) in enumerate(completed, start=1):
+                                heatmap_data[cells[i]] = prob
+                                progress_bar.progress(done / len(cells))
+                        else:
+                            for done, (row, j) in enumerate(cells, start=1):
+                                heatmap_data[row, j], _, _ = simulate_correlation(
+                                    results, criteria_arrays, dict(run_settings, step1_keep=step1_values[row]),
+                                    run_correlations[j], fitted_model
+                                )
+                                progress_bar.progress(done / len(cells))
+                        
+                        # Skipped rows stay empty; drop them so the y axis has no duplicate keeps
+                        keep_rows = sorted(rows + [1])
+                        st.session_state["heatmap_step1_keep"] = [step1_values[row] for row in keep_rows]
+                        st.session_state["heatmap_data"] = heatmap_data[keep_rows]
+                
                 plot_correlation_heatmap(st.session_state)
                 plot_clone_selection_flow(st.session_state, settings)
         
         with tab5:
             # AI Agent Interface
+            from ai_agent import create_ai_agent_interface
             create_ai_agent_interface()
         
         with tab6:
@@ -300,9 +433,10 @@ def main():
                 # Summary statistics
                 st.markdown("#### Key Findings")
                 
-                max_prob = max(st.session_state["probabilities"])
-                min_prob = min(st.session_state["probabilities"])
-                avg_prob = np.mean(st.session_state["probabilities"])
+                summary = st.session_state["probability_summary"]
+                max_prob = summary["max_prob"]
+                min_prob = summary["min_prob"]
+                avg_prob = summary["avg_prob"]
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
@@ -315,7 +449,7 @@ def main():
                 # Recommendations
                 st.markdown("#### 💡 Recommendations")
                 
-                optimal_corr = st.session_state["correlations"][np.argmax(st.session_state["probabilities"])]
+                optimal_corr = summary["optimal_corr"]
                 
                 recommendations = []
                 if max_prob > 0.8:
@@ -340,10 +474,13 @@ def main():
                         "Correlation": st.session_state["correlations"],
                         "Success_Probability": st.session_state["probabilities"]
                     })
-                    csv = results_df.to_csv(index=False)
+                    # Write the CSV straight into a bytes buffer instead of an intermediate str
+                    csv_buffer = io.BytesIO()
+                    results_df.to_csv(csv_buffer, index=False, lineterminator="\n")
+                    csv_buffer.seek(0)
                     st.download_button(
                         label="📥 Download CSV",
-                        data=csv,
+                        data=csv_buffer,
                         file_name="clone_selection_results.csv",
                         mime="text/csv"
                     )
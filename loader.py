@@ -1,7 +1,66 @@
+import io
+from typing import NamedTuple
 import pandas as pd
 import streamlit as st
 import numpy as np
 
+class ResultsSummary(NamedTuple):
+    """Scalar statistics of the valid Results values."""
+    count: int
+    mean: float
+    std: float
+    min: float
+    max: float
+    skew: float
+    q1: float
+    q3: float
+    n_outliers: int
+
+@st.cache_data(show_spinner=False)
+def _summarize_results(results):
+    """Compute a ResultsSummary for a NaN-free float64 array, cached on its contents."""
+    if results.size == 0:
+        nan = float("nan")
+        return ResultsSummary(0, nan, nan, nan, nan, nan, nan, nan, 0)
+    
+    q1, q3 = np.quantile(results, (0.25, 0.75))
+    iqr = q3 - q1
+    n_outliers = int(np.count_nonzero((results < q1 - 1.5 * iqr) | (results > q3 + 1.5 * iqr)))
+    
+    return ResultsSummary(
+        count=int(results.size),
+        mean=float(results.mean()),
+        # Sample std (ddof=1) and bias-corrected skew, as pandas reports them
+        std=float(results.std(ddof=1)) if results.size > 1 else float("nan"),
+        min=float(results.min()),
+        max=float(results.max()),
+        skew=float(pd.Series(results).skew()),
+        q1=float(q1),
+        q3=float(q3),
+        n_outliers=n_outliers
+    )
+
+def get_results_summary(df):
+    """Summary statistics of df["Results"]; repeated calls on unchanged data hit the cache."""
+    results = df["Results"].to_numpy(dtype=np.float64, copy=False)
+    return _summarize_results(results[~np.isnan(results)])
+
+@st.cache_data(show_spinner=False)
+def _list_sheets(file_bytes):
+    """Sheet names of an Excel workbook, cached on the file contents."""
+    return pd.ExcelFile(io.BytesIO(file_bytes)).sheet_names
+
+@st.cache_data(show_spinner=False)
+def _read_sheet(file_bytes, sheet_name):
+    """Parse one sheet of an Excel workbook, cached on the file contents and sheet."""
+    return pd.read_excel(io.BytesIO(file_bytes), sheet_name=sheet_name)
+
+def get_criteria_columns(columns):
+    """Return the column labels starting with "criteria" (case-insensitive)."""
+    columns = pd.Index(columns)
+    mask = columns.astype(str).str.lower().str.startswith("criteria")
+    return columns[mask].tolist()
+
 def load_data(uploaded_file):
     """
     Load and validate data from uploaded Excel file.
@@ -13,9 +72,9 @@ def load_data(uploaded_file):
         tuple: (dataframe, selected_sheet, criteria_columns)
     """
     try:
-        # Get sheet names
-        excel_file = pd.ExcelFile(uploaded_file)
-        sheet_names = excel_file.sheet_names
+        # Get sheet names (parsing is cached, so reruns skip re-reading the workbook)
+        file_bytes = uploaded_file.getvalue()
+        sheet_names = _list_sheets(file_bytes)
         
         if not sheet_names:
             st.error("❌ No sheets found in the Excel file.")
@@ -29,7 +88,7 @@ def load_data(uploaded_file):
         )
         
         # Load data
-        df = pd.read_excel(uploaded_file, sheet_name=selected_sheet)
+        df = _read_sheet(file_bytes, selected_sheet)
         
         # Basic validation
         if df.empty:
@@ -41,11 +100,11 @@ def load_data(uploaded_file):
             st.error("❌ No 'Results' column found. Please ensure your data has a column named 'Results'.")
             return None, selected_sheet, []
         
-        # Data cleaning and preprocessing
-        df = preprocess_data(df)
+        # Identify criteria columns once; preprocessing drops rows, never columns
+        criteria_columns = get_criteria_columns(df.columns)
         
-        # Identify criteria columns
-        criteria_columns = [col for col in df.columns if col.lower().startswith("criteria")]
+        # Data cleaning and preprocessing
+        df = preprocess_data(df, criteria_columns)
         
         # Display data summary
         display_data_summary(df, selected_sheet, criteria_columns)
@@ -57,9 +116,27 @@ def load_data(uploaded_file):
         st.exception(e)
         return None, None, []
 
-def preprocess_data(df):
-    """Preprocess and clean the data."""
-    df_clean = df.copy()
+def preprocess_data(df, criteria_columns=None):
+    """Preprocess and clean the data.
+    
+    Returns the cleaned frame; always use the return value and don't reuse
+    ``df`` afterwards. ``criteria_columns`` may be supplied when the caller has
+    already detected them.
+    """
+    if criteria_columns is None:
+        criteria_columns = get_criteria_columns(df.columns)
+    df_clean, removed_count = _clean_data(df, criteria_columns)
+    
+    if removed_count > 0:
+        st.warning(f"⚠️ Removed {removed_count} rows with invalid Results values.")
+    
+    return df_clean
+
+@st.cache_data(show_spinner=False)
+def _clean_data(df, criteria_columns):
+    """Numeric conversion and row cleanup behind preprocess_data; returns (df, removed_count)."""
+    df_clean = df
+    removed_count = 0
     
     # Convert Results column to numeric, handling errors
     if "Results" in df_clean.columns:
@@ -67,44 +144,40 @@ def preprocess_data(df):
         
         # Remove rows with invalid Results
         initial_count = len(df_clean)
-        df_clean = df_clean.dropna(subset=["Results"])
+        df_clean.dropna(subset=["Results"], inplace=True)
         removed_count = initial_count - len(df_clean)
-        
-        if removed_count > 0:
-            st.warning(f"⚠️ Removed {removed_count} rows with invalid Results values.")
     
-    # Process criteria columns
-    criteria_columns = [col for col in df_clean.columns if col.lower().startswith("criteria")]
-    for col in criteria_columns:
-        df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce')
+    # Process criteria columns; columns Excel already typed as numeric need no coercion
+    to_convert = df_clean[criteria_columns].select_dtypes(exclude="number").columns
+    if len(to_convert) > 0:
+        df_clean[to_convert] = df_clean[to_convert].apply(pd.to_numeric, errors='coerce')
     
     # Remove completely empty rows
-    df_clean = df_clean.dropna(how='all')
+    df_clean.dropna(how='all', inplace=True)
     
-    return df_clean
+    return df_clean, removed_count
 
 def display_data_summary(df, sheet_name, criteria_columns):
     """Display a summary of the loaded data."""
     st.sidebar.markdown("### 📊 Data Summary")
     
     # Basic statistics
+    summary = get_results_summary(df)
     total_rows = len(df)
-    valid_results = df["Results"].notna().sum()
+    valid_results = summary.count
     missing_results = total_rows - valid_results
     
     # Results statistics
     if valid_results > 0:
-        results_stats = df["Results"].describe()
-        
         st.sidebar.markdown(f"""
         **📈 Results Statistics:**
         - **Total Rows:** {total_rows:,}
         - **Valid Results:** {valid_results:,}
         - **Missing Results:** {missing_results:,}
-        - **Mean:** {results_stats['mean']:.3f}
-        - **Std Dev:** {results_stats['std']:.3f}
-        - **Min:** {results_stats['min']:.3f}
-        - **Max:** {results_stats['max']:.3f}
+        - **Mean:** {summary.mean:.3f}
+        - **Std Dev:** {summary.std:.3f}
+        - **Min:** {summary.min:.3f}
+        - **Max:** {summary.max:.3f}
         """)
     
     # Criteria columns summary
@@ -119,19 +192,14 @@ def display_data_summary(df, sheet_name, criteria_columns):
     
     # Check for outliers in Results
     if valid_results > 0:
-        Q1 = df["Results"].quantile(0.25)
-        Q3 = df["Results"].quantile(0.75)
-        IQR = Q3 - Q1
-        outliers = df[(df["Results"] < Q1 - 1.5 * IQR) | (df["Results"] > Q3 + 1.5 * IQR)]
-        
-        if len(outliers) > 0:
-            st.sidebar.markdown(f"⚠️ **Outliers:** {len(outliers)} potential outliers detected")
+        if summary.n_outliers > 0:
+            st.sidebar.markdown(f"⚠️ **Outliers:** {summary.n_outliers} potential outliers detected")
         else:
             st.sidebar.markdown("✅ **Outliers:** No significant outliers detected")
     
     # Check data distribution
     if valid_results > 0:
-        skewness = df["Results"].skew()
+        skewness = summary.skew
         if abs(skewness) > 1:
             st.sidebar.markdown(f"📊 **Distribution:** Skewed ({skewness:.2f})")
         else:
@@ -142,7 +210,7 @@ def validate_workflow_parameters(df, step1_keep, step2_keep, step3_keep, workflo
     errors = []
     warnings = []
     
-    total_clones = len(df["Results"].dropna())
+    total_clones = get_results_summary(df).count
     
     # Check if step1_keep exceeds available data
     if step1_keep > total_clones:
@@ -181,7 +249,8 @@ def get_data_recommendations(df, criteria_columns):
     """Generate recommendations based on data characteristics."""
     recommendations = []
     
-    total_clones = len(df["Results"].dropna())
+    summary = get_results_summary(df)
+    total_clones = summary.count
     
     # Recommend step sizes based on data size
     if total_clones >= 2000:
@@ -198,8 +267,8 @@ def get_data_recommendations(df, criteria_columns):
         recommendations.append("📋 **No criteria columns** - Consider adding quality criteria for better filtering")
     
     # Check data distribution
-    if len(df["Results"].dropna()) > 0:
-        skewness = df["Results"].skew()
+    if total_clones > 0:
+        skewness = summary.skew
         if abs(skewness) > 2:
             recommendations.append("📈 **Highly skewed data** - Consider using KDE instead of lognormal distribution")
         elif abs(skewness) > 1:
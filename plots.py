@@ -1,16 +1,38 @@
-import matplotlib.pyplot as plt
 import streamlit as st
 import numpy as np
 import plotly.graph_objects as go
-import plotly.express as px
+import plotly.io as pio
 from plotly.subplots import make_subplots
-import seaborn as sns
-from simulation import generate_samples, fit_lognormal
-import pandas as pd
+from simulation import generate_samples
 
-# Set style for matplotlib
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+try:
+    import orjson
+except ImportError:  # orjson is optional; plotly falls back to its stdlib encoder
+    orjson = None
+
+# st.plotly_chart serializes through plotly.io; orjson encodes NumPy arrays natively
+if orjson is not None:
+    pio.json.config.default_engine = "orjson"
+
+# Plotly config for dashboard tiles that are never zoomed or hovered
+STATIC_CHART_CONFIG = {"staticPlot": True, "displayModeBar": False}
+
+# Largest number of points from one series that a plot will process
+MAX_PLOT_POINTS = 50_000
+
+def _downsample(x, k=MAX_PLOT_POINTS):
+    """Uniform random subset of at most k points, fixed-seed so reruns look identical."""
+    x = np.asarray(x)
+    if x.size <= k:
+        return x
+    return x[np.random.default_rng(0).choice(x.size, k, replace=False)]
+
+def _histogram_bar(data, bins, **trace_kwargs):
+    """Bin data with NumPy and return it as a bar trace, so the figure carries
+    one value per bin instead of every raw point."""
+    counts, edges = np.histogram(np.asarray(data, dtype=np.float64), bins=bins)
+    centers = 0.5 * (edges[:-1] + edges[1:])
+    return go.Bar(x=centers, y=counts, width=np.diff(edges), **trace_kwargs)
 
 def plot_criteria_distributions(df, criteria_columns):
     """Plot distributions of criteria columns using plotly."""
@@ -25,21 +47,25 @@ def plot_criteria_distributions(df, criteria_columns):
     fig = make_subplots(
         rows=rows, cols=cols,
         subplot_titles=criteria_columns,
-        specs=[[{"secondary_y": False}] * cols] * rows
+        specs=[[{} for _ in range(cols)] for _ in range(rows)]
     )
     
+    # One contiguous float block for all criteria instead of a Series copy per column
+    block = df[criteria_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    
     for i, col in enumerate(criteria_columns):
         row = i // cols + 1
         col_idx = i % cols + 1
         
         # Get data for this column
-        data = df[col].dropna()
+        data = block[:, i]
+        data = data[~np.isnan(data)]
         
         # Create histogram
         fig.add_trace(
-            go.Histogram(
-                x=data,
-                nbinsx=30,
+            _histogram_bar(
+                data,
+                bins=30,
                 name=col,
                 showlegend=False,
                 marker_color='lightblue',
@@ -66,25 +92,36 @@ def plot_criteria_distributions(df, criteria_columns):
     
     st.plotly_chart(fig, use_container_width=True)
 
-def plot_distribution_comparison(real, synthetic_model, method):
+@st.cache_data(show_spinner=False)
+def _synthetic_samples(real, method, fitted_model, size, seed):
+    """Synthetic draw for the comparison plot, cached on the data, method, fit and seed."""
+    rng = np.random.default_rng(seed)
+    return generate_samples(real, size=size, method=method, fitted_model=fitted_model, random_state=rng)
+
+def plot_distribution_comparison(real, synthetic_model, method, random_seed=None):
     """Plot comparison between real and synthetic data distributions."""
-    synthetic = generate_samples(real, size=10000, method=method, fitted_model=synthetic_model)
+    synthetic = _synthetic_samples(real, method, synthetic_model, 10000, random_seed)
+    
+    # Bin both series on the same edges so the overlaid bars line up
+    real = _downsample(np.asarray(real, dtype=np.float64))
+    synthetic = _downsample(synthetic)
+    edges = np.histogram_bin_edges(np.concatenate([real, synthetic]), bins=50)
     
     fig = go.Figure()
     
     # Real data histogram
-    fig.add_trace(go.Histogram(
-        x=real,
-        nbinsx=50,
+    fig.add_trace(_histogram_bar(
+        real,
+        bins=edges,
         name="Real Data",
         opacity=0.7,
         marker_color='blue'
     ))
     
     # Synthetic data histogram
-    fig.add_trace(go.Histogram(
-        x=synthetic,
-        nbinsx=50,
+    fig.add_trace(_histogram_bar(
+        synthetic,
+        bins=edges,
         name=f"Synthetic ({method})",
         opacity=0.7,
         marker_color='orange'
@@ -100,23 +137,22 @@ def plot_distribution_comparison(real, synthetic_model, method):
     
     st.plotly_chart(fig, use_container_width=True)
 
-def plot_success_prob_vs_corr(correlations, probabilities):
-    """Plot success probability vs correlation with enhanced styling."""
+def _build_success_prob_vs_corr(correlations, probabilities, max_idx):
+    """Figure for plot_success_prob_vs_corr."""
     fig = go.Figure()
     
-    # Main line plot
-    fig.add_trace(go.Scatter(
+    # Main line plot (WebGL, so long correlation sweeps stay responsive)
+    fig.add_trace(go.Scattergl(
         x=correlations,
         y=probabilities,
         mode='lines+markers',
         name='Success Probability',
         line=dict(color='#1f77b4', width=3),
-        marker=dict(size=8, color='#1f77b4')
+        marker=dict(size=8, color='#1f77b4', line=dict(width=0))
     ))
     
     # Highlight maximum point
-    max_idx = np.argmax(probabilities)
-    fig.add_trace(go.Scatter(
+    fig.add_trace(go.Scattergl(
         x=[correlations[max_idx]],
         y=[probabilities[max_idx]],
         mode='markers',
@@ -130,57 +166,77 @@ def plot_success_prob_vs_corr(correlations, probabilities):
         xaxis_title="Correlation Between Assay Steps",
         yaxis_title="Probability (Final Clones in Top X%)",
         height=500,
-        hovermode='x unified'
+        hovermode='x unified',
+        uirevision='success_prob_vs_corr'
     )
     
     # Add grid
     fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
     fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
     
+    return fig
+
+def plot_success_prob_vs_corr(correlations, probabilities):
+    """Plot success probability vs correlation with enhanced styling."""
+    # Reuse the figure and its metrics across reruns until the simulation results change
+    probs = np.asarray(probabilities, dtype=np.float64)
+    fig_key = (tuple(correlations), tuple(probs.tolist()))
+    cached = st.session_state.get("success_prob_vs_corr_fig")
+    if cached is not None and cached[0] == fig_key:
+        _, fig, (max_prob, min_prob, max_corr) = cached
+    else:
+        max_idx = int(probs.argmax())
+        max_prob = float(probs[max_idx])
+        min_prob = float(probs.min())
+        max_corr = correlations[max_idx]
+        fig = _build_success_prob_vs_corr(correlations, probs, max_idx)
+        st.session_state["success_prob_vs_corr_fig"] = (fig_key, fig, (max_prob, min_prob, max_corr))
+    
     st.plotly_chart(fig, use_container_width=True)
     
     # Display key metrics
-    max_prob = max(probabilities)
-    max_corr = correlations[np.argmax(probabilities)]
-    
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("Maximum Success Rate", f"{max_prob:.1%}")
     with col2:
         st.metric("Optimal Correlation", f"{max_corr:.2f}")
     with col3:
-        st.metric("Improvement Range", f"{max_prob - min(probabilities):.1%}")
+        st.metric("Improvement Range", f"{max_prob - min_prob:.1%}")
 
 def plot_success_histogram(state):
     """Plot histogram of successful clones with interactive selection."""
-    correlations = state["correlations"]
+    correlations = tuple(state["correlations"])
     probabilities = state["probabilities"]
     best_idx = int(np.argmax(probabilities))
     best_corr = correlations[best_idx]
+    prob_map = dict(zip(correlations, probabilities))
     
     # Create selection widget
     selected_corr = st.selectbox(
         "Select correlation for clone success histogram:",
         correlations, 
         index=best_idx,
-        format_func=lambda x: f"{x:.2f} (Success: {probabilities[correlations.index(x)]:.1%})"
+        format_func=lambda x: f"{x:.2f} (Success: {prob_map[x]:.1%})"
     )
     
-    counts = state["success_data_by_corr"][selected_corr]
+    counts = np.asarray(state["success_data_by_corr"][selected_corr], dtype=np.intp)
     step2_keep = state["step2_keep"]
     
+    # Success counts are small non-negative integers, so count each value exactly
+    pmf = np.bincount(counts, minlength=step2_keep + 1)
+    
     fig = go.Figure()
     
-    fig.add_trace(go.Histogram(
-        x=counts,
-        nbinsx=step2_keep + 1,
+    fig.add_trace(go.Bar(
+        x=np.arange(pmf.size),
+        y=pmf,
         name='Success Counts',
         marker_color='lightblue',
         opacity=0.8
     ))
     
     # Add mean line
-    mean_count = np.mean(counts)
+    mean_count = counts.mean()
     fig.add_vline(
         x=mean_count,
         line_dash="dash",
@@ -219,7 +275,7 @@ def plot_workflow_comparison(workflow_comparison):
         height=400
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(fig, use_container_width=True, config=STATIC_CHART_CONFIG)
     
     # Display comparison metrics
     if len(probabilities) == 2:
@@ -251,13 +307,13 @@ def plot_sensitivity_analysis(sensitivity_results):
         probabilities = data['probabilities']
         
         fig.add_trace(
-            go.Scatter(
+            go.Scattergl(
                 x=values,
                 y=probabilities,
                 mode='lines+markers',
                 name=param_name.replace('_', ' ').title(),
                 line=dict(color=colors[i % len(colors)], width=3),
-                marker=dict(size=8),
+                marker=dict(size=8, line=dict(width=0)),
                 showlegend=False
             ),
             row=1, col=i+1
@@ -276,7 +332,8 @@ def plot_sensitivity_analysis(sensitivity_results):
     fig.update_layout(
         title="Sensitivity Analysis: Parameter Effects on Success Probability",
         height=400,
-        showlegend=False
+        showlegend=False,
+        uirevision='sensitivity_analysis'
     )
     
     st.plotly_chart(fig, use_container_width=True)
@@ -285,43 +342,43 @@ def plot_sensitivity_analysis(sensitivity_results):
     st.markdown("### Sensitivity Analysis Summary")
     summary_data = []
     for param_name, data in sensitivity_results.items():
-        values = data['values']
-        probabilities = data['probabilities']
+        values = np.asarray(data['values'])
+        probabilities = np.asarray(data['probabilities'], dtype=np.float64)
         
         # Calculate sensitivity metrics
-        max_prob = max(probabilities)
-        min_prob = min(probabilities)
+        max_prob = probabilities.max()
+        min_prob = probabilities.min()
         range_prob = max_prob - min_prob
-        baseline = probabilities[len(probabilities)//2]
+        baseline = probabilities[probabilities.size // 2]
         
         summary_data.append({
             'Parameter': param_name.replace('_', ' ').title(),
-            'Range': f"{min(values)} - {max(values)}",
+            'Range': f"{values.min()} - {values.max()}",
             'Max Success': f"{max_prob:.1%}",
             'Min Success': f"{min_prob:.1%}",
             'Sensitivity': f"{range_prob:.1%}",
             'Baseline': f"{baseline:.1%}"
         })
     
-    summary_df = pd.DataFrame(summary_data)
-    st.dataframe(summary_df, use_container_width=True)
+    st.dataframe(summary_data, use_container_width=True)
 
 def plot_correlation_heatmap(state):
-    """Plot correlation heatmap showing parameter interactions."""
+    """Plot correlation heatmap showing parameter interactions.
+    
+    Expects ``state["heatmap_data"]``, a (step 1 keep x correlation) grid of
+    success probabilities with rows labelled by ``state["heatmap_step1_keep"]``;
+    nothing is drawn until such a grid has been computed.
+    """
     if "probabilities" not in state:
         return
     
-    correlations = state["correlations"]
-    probabilities = state["probabilities"]
-    
-    # Create a matrix for heatmap (example with step parameters)
-    settings = state.get("settings", {})
-    step1_range = [int(settings.get("step1_keep", 96) * 0.8), 
-                   settings.get("step1_keep", 96),
-                   int(settings.get("step1_keep", 96) * 1.2)]
+    heatmap_data = state.get("heatmap_data")
+    if heatmap_data is None:
+        return
     
-    # Create sample data for heatmap (in real implementation, this would be computed)
-    heatmap_data = np.random.rand(len(step1_range), len(correlations)) * 0.3 + 0.2
+    correlations = state["correlations"]
+    heatmap_data = np.asarray(heatmap_data, dtype=np.float64)
+    step1_range = state["heatmap_step1_keep"]
     
     fig = go.Figure(data=go.Heatmap(
         z=heatmap_data,
@@ -348,38 +405,26 @@ def plot_clone_selection_flow(state, settings):
     if "probabilities" not in state:
         return
     
-    # Create a Sankey-like flow diagram
-    fig = go.Figure(data=[go.Sankey(
-        node = dict(
-            pad = 15,
-            thickness = 20,
-            line = dict(color = "black", width = 0.5),
-            label = [
-                f"Initial Clones\n({len(state['results']):,})",
-                f"Step 1 Selection\n({settings['step1_keep']})",
-                f"Step 2 Selection\n({settings['step2_keep']})",
-                f"Final Selection\n({settings['step3_keep']})"
-            ],
-            color = "blue"
-        ),
-        link = dict(
-            source = [0, 1, 2],  # indices correspond to labels
-            target = [1, 2, 3],
-            value = [
-                settings['step1_keep'],
-                settings['step2_keep'],
-                settings['step3_keep']
-            ]
-        )
+    # Clone counts at each stage as a simple bar chain (cheaper to lay out than a Sankey)
+    stages = ["Initial Clones", "Step 1 Selection", "Step 2 Selection", "Final Selection"]
+    counts = [len(state['results']), settings['step1_keep'], settings['step2_keep'], settings['step3_keep']]
+    
+    fig = go.Figure(data=[go.Bar(
+        x=stages,
+        y=counts,
+        marker_color="blue",
+        text=[f"{c:,}" for c in counts],
+        textposition='auto'
     )])
     
     fig.update_layout(
         title_text="Clone Selection Flow",
         font_size=10,
+        yaxis_title="Clones",
         height=400
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(fig, use_container_width=True, config=STATIC_CHART_CONFIG)
 
 def plot_efficiency_metrics(settings):
     """Plot workflow efficiency metrics."""
@@ -422,7 +467,7 @@ def plot_efficiency_metrics(settings):
         height=400
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(fig, use_container_width=True, config=STATIC_CHART_CONFIG)
     
     # Display efficiency table
     st.markdown("### Efficiency Metrics")
@@ -435,5 +480,4 @@ def plot_efficiency_metrics(settings):
             f"{efficiency['overall_efficiency']:.1%}"
         ]
     }
-    eff_df = pd.DataFrame(eff_data)
-    st.dataframe(eff_df, use_container_width=True)
+    st.table(eff_data)
@@ -1,5 +1,11 @@
 import streamlit as st
 import numpy as np
+import pandas as pd
+
+@st.cache_data(show_spinner=False)
+def _default_thresholds(df, criteria_columns):
+    """Median of each numeric criteria column, used as the default filter threshold."""
+    return df[criteria_columns].median(numeric_only=True).to_dict()
 
 def configure_sidebar(df, results, criteria_columns):
     """Configure the sidebar with all simulation parameters in an organized manner."""
@@ -77,7 +83,13 @@ def configure_sidebar(df, results, criteria_columns):
         index=0,
         help="Step size for correlation analysis (smaller = more detailed)"
     )
-    correlations = np.round(np.arange(correlation_range[0], correlation_range[1]+step_size, step_size), 2)
+    # Integer point count so float drift can't add or drop the endpoint; the grid
+    # keeps the selected spacing and stops at the last step inside the range
+    lo, hi = correlation_range
+    n_corr = int(np.floor((hi - lo) / step_size + 1e-9)) + 1
+    correlations = tuple(
+        float(c) for c in np.round(np.linspace(lo, lo + (n_corr - 1) * step_size, n_corr), 2)
+    )
     
     # Simulation Parameters
     st.sidebar.markdown("### ⚙️ Simulation Parameters")
@@ -96,34 +108,39 @@ def configure_sidebar(df, results, criteria_columns):
         help="Apply filtering criteria at the final selection step"
     )
     
-    # Criteria settings
+    # Criteria settings: one editable table instead of three widgets per column
     criteria_settings = []
     if criteria_columns:
         st.sidebar.markdown("**Filtering Criteria:**")
-        for col in criteria_columns:
-            if st.sidebar.checkbox(f"Use {col}", key=f"use_{col}"):
-                col1, col2 = st.sidebar.columns(2)
-                with col1:
-                    op = st.selectbox(
-                        f"{col} Operator", 
-                        [">=", "<=", "="], 
-                        key=f"{col}_comp"
-                    )
-                with col2:
-                    # Get reasonable default value based on data
-                    col_data = df[col].dropna()
-                    if len(col_data) > 0:
-                        default_val = float(col_data.quantile(0.5))
-                    else:
-                        default_val = 0.0
-                    
-                    val = st.number_input(
-                        f"{col} Threshold", 
-                        value=default_val, 
-                        format="%.5f", 
-                        key=f"{col}_thresh"
-                    )
-                criteria_settings.append((col, op, val))
+        # Get reasonable default values based on data; empty columns fall back to 0
+        medians = _default_thresholds(df, criteria_columns)
+        thresholds = [
+            float(np.nan_to_num(medians.get(col, 0.0), nan=0.0)) for col in criteria_columns
+        ]
+        
+        defaults = pd.DataFrame({
+            "column": criteria_columns,
+            "enabled": False,
+            "op": ">=",
+            "threshold": thresholds
+        })
+        edited = st.sidebar.data_editor(
+            defaults,
+            column_config={
+                "column": st.column_config.TextColumn("Criteria", disabled=True),
+                "enabled": st.column_config.CheckboxColumn("Use"),
+                "op": st.column_config.SelectboxColumn("Operator", options=[">=", "<=", "="], required=True),
+                "threshold": st.column_config.NumberColumn("Threshold", format="%.5f", required=True)
+            },
+            hide_index=True,
+            num_rows="fixed",
+            key="criteria_editor"
+        )
+        criteria_settings = [
+            (row.column, row.op, float(row.threshold))
+            for row in edited.itertuples(index=False)
+            if row.enabled
+        ]
     
     # Advanced Options
     with st.sidebar.expander("🔧 Advanced Options", expanded=False):
@@ -146,11 +163,14 @@ def configure_sidebar(df, results, criteria_columns):
         # Random seed for reproducibility
         random_seed = st.number_input(
             "Random Seed", 
+            min_value=0,
             value=42,
             help="Set random seed for reproducible results"
         )
     
     # Information Panel
+    from plots import MAX_PLOT_POINTS
+    
     with st.sidebar.expander("ℹ️ Information", expanded=False):
         st.markdown(f"""
         **Current Configuration:**
@@ -167,6 +187,7 @@ def configure_sidebar(df, results, criteria_columns):
         - **Correlation Range:** {correlation_range[0]:.2f} - {correlation_range[1]:.2f}
         - **Simulations:** {n_rep:,}
         - **Success Threshold:** Top {top_x_percent}%
+        - **Plot Sample Cap:** {MAX_PLOT_POINTS:,} points per series
         """)
         
         if criteria_settings:
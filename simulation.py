@@ -1,6 +1,6 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
-from scipy.stats import lognorm, gaussian_kde
-import pandas as pd
+from scipy.stats import lognorm, gaussian_kde, binom, hypergeom
 
 def fit_lognormal(data):
     """Fit lognormal distribution to data."""
@@ -10,61 +10,182 @@ def fit_lognormal(data):
         raise ValueError("No positive data points for lognormal fitting")
     return lognorm.fit(data, floc=0)
 
-def generate_samples(data, size, method="lognormal", fitted_model=None):
-    """Generate synthetic samples using specified distribution method."""
+def _make_sampler(data, method="lognormal", fitted_model=None, random_state=None,
+                  dtype=np.float64):
+    """Fit (or reuse ``fitted_model``) once and return a ``draw(size, out=None)`` function.
+    
+    Lognormal samples are generated as exp(mu + sigma * z) from standard normals
+    in ``dtype``, and the KDE bandwidth is estimated once, so repeated draws skip
+    scipy's per-call setup. Passing ``out`` (a C-contiguous ``dtype`` array)
+    fills it in place instead of allocating. With no ``random_state`` the
+    generator is seeded from NumPy's global state, so np.random.seed still applies.
+    """
     data = np.array(data).flatten()
     data = data[data > 0]
     
     if len(data) == 0:
         raise ValueError("No valid data points for sample generation")
     
+    if random_state is None:
+        # Explicit dtype: the default int_ is int32 on Windows with NumPy < 2
+        random_state = np.random.randint(2**32, dtype=np.uint64)
+    rng = np.random.default_rng(random_state)
+    
     if method == "lognormal":
         shape, loc, scale = fitted_model or fit_lognormal(data)
-        return lognorm.rvs(shape, loc=loc, scale=scale, size=size)
+        # Python floats so the arithmetic stays in dtype
+        mu, sigma, loc = float(np.log(scale)), float(shape), float(loc)
+        
+        def draw(size, out=None):
+            samples = rng.standard_normal(size, dtype=dtype, out=out)
+            samples *= sigma
+            samples += mu
+            np.exp(samples, out=samples)
+            if loc:
+                samples += loc
+            return samples
+        
+        return draw
     elif method == "kde":
-        kde = gaussian_kde(data)
-        return kde.resample(size).flatten()
+        # Sample the KDE directly: pick a data point, add Gaussian noise at the
+        # KDE bandwidth (what gaussian_kde.resample does, minus its per-call setup)
+        bandwidth = float(np.sqrt(gaussian_kde(data).covariance[0, 0]))
+        points = data.astype(dtype)
+        
+        def draw(size, out=None):
+            samples = rng.standard_normal(size, dtype=dtype, out=out)
+            samples *= bandwidth
+            samples += points[rng.integers(0, len(points), size=samples.shape)]
+            return samples
+        
+        return draw
     else:
         raise ValueError("Unsupported distribution method")
 
+def generate_samples(data, size, method="lognormal", fitted_model=None, random_state=None):
+    """Generate synthetic samples using specified distribution method.
+    
+    ``size`` may be an int or a shape tuple. ``random_state`` (seed or
+    np.random.Generator) seeds the sampler; None draws from NumPy's global state.
+    """
+    return _make_sampler(data, method, fitted_model, random_state)(size)
+
+# Criteria operators -> vectorized comparison of (values, thresholds)
+_CRITERIA_OPS = {
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    "=": lambda values, thresholds: np.abs(values - thresholds) < 1e-10,
+}
+
 def apply_criteria_filter(df, criteria_settings, indices):
-    """Apply criteria filtering to selected indices."""
-    if not criteria_settings:
-        return np.ones(len(indices), dtype=bool)
+    """Apply criteria filtering to selected indices.
     
+    ``df`` may be a DataFrame or a mapping of criteria column name -> ndarray.
+    Criteria sharing an operator are stacked and compared in one vectorized pass.
+    """
     filter_mask = np.ones(len(indices), dtype=bool)
+    if not criteria_settings:
+        return filter_mask
+    
+    # Group the criteria present in df by operator
+    by_op = {}
     for crit_col, op, thresh in criteria_settings:
-        if crit_col not in df.columns:
-            continue
-        
-        col_vals = df[crit_col].values[indices]
-        if op == ">=":
-            filter_mask &= col_vals >= thresh
-        elif op == "<=":
-            filter_mask &= col_vals <= thresh
-        elif op == "=":
-            filter_mask &= np.abs(col_vals - thresh) < 1e-10
-        else:
+        if op not in _CRITERIA_OPS:
             raise ValueError(f"Unsupported operator: {op}")
+        if crit_col not in df:
+            continue
+        by_op.setdefault(op, ([], []))
+        by_op[op][0].append(np.asarray(df[crit_col], dtype=np.float64)[indices])
+        by_op[op][1].append(thresh)
+    
+    for op, (columns, thresholds) in by_op.items():
+        col_vals = np.stack(columns)
+        thresholds = np.asarray(thresholds, dtype=np.float64)[:, None]
+        filter_mask &= _CRITERIA_OPS[op](col_vals, thresholds).all(axis=0)
     
     return filter_mask
 
+# Upper bound on samples drawn per batch of Monte Carlo replicates (~16 MB of float32)
+_REP_BATCH_ELEMENTS = 1 << 22
+
+def _top_k(a, k):
+    """Column indices of the k largest values in each row of a 2-D array (unordered).
+    
+    Only membership of the top k is used downstream, so a partition suffices.
+    """
+    return np.argpartition(a, -k, axis=1)[:, -k:]
+
+def _exceedance_probability(data, method, fitted_model, cutoff):
+    """P(sample >= cutoff) under the distribution _make_sampler draws from."""
+    data = np.array(data).flatten()
+    data = data[data > 0]
+    cutoff = float(cutoff)
+    if method == "lognormal":
+        shape, loc, scale = fitted_model or fit_lognormal(data)
+        return float(lognorm.sf(cutoff, shape, loc=loc, scale=scale))
+    return float(gaussian_kde(data).integrate_box_1d(cutoff, np.inf))
+
+def _closed_form_workflow(n_candidates, step1_keep, final_keep, p_exceed, correlation, n_rep):
+    """Exact success probability for correlation 0 or 1, plus sampled success counts.
+    
+    The number of step-1 draws at or above the cutoff is Binomial(n_candidates,
+    p_exceed). At correlation 1 later steps re-rank the same values, so the final
+    clones are the overall top ``final_keep``; at correlation 0 they are a uniformly
+    random subset of the step-1 top ``step1_keep``.
+    """
+    n_above = np.arange(n_candidates + 1)
+    p_n_above = binom.pmf(n_above, n_candidates, p_exceed)
+    top1_above = np.minimum(n_above, step1_keep)
+    
+    # Per-replicate counts for the success histogram
+    drawn_above = np.minimum(np.random.binomial(n_candidates, p_exceed, size=n_rep), step1_keep)
+    
+    if correlation == 1.0:
+        success_probability = float(p_n_above[final_keep:].sum())
+        success_counts = np.minimum(drawn_above, final_keep)
+    else:
+        success_probability = float(np.dot(
+            p_n_above, hypergeom.pmf(final_keep, step1_keep, top1_above, final_keep)
+        ))
+        success_counts = np.random.hypergeometric(drawn_above, step1_keep - drawn_above, final_keep)
+    
+    return success_probability, success_counts.astype(np.intp, copy=False)
+
+def _correlated_assay(scores, noise, correlation, noise_scale):
+    """correlation * scores + noise_scale * noise, accumulated into ``noise`` in place."""
+    noise *= noise_scale
+    noise += np.multiply(scores, correlation, dtype=noise.dtype)
+    return noise
+
 def simulate_workflow(real_data, df, top_x_percent, step1_keep, step2_keep, step3_keep,
-                      correlation, n_rep, method, criteria_settings, apply_criteria, workflow_steps):
+                      correlation, n_rep, method, criteria_settings, apply_criteria, workflow_steps,
+                      fitted_model=None, cutoff=None):
     """
     Simulate clone selection workflow with Monte Carlo approach.
     
+    ``df`` supplies the criteria columns, either as a DataFrame or as a mapping
+    of column name -> ndarray aligned with ``real_data``. A precomputed
+    ``fitted_model`` (from fit_lognormal on the same data) can be
+    passed to skip refitting when sweeping other parameters, and likewise a
+    precomputed top-X% ``cutoff``.
+    
+    Replicates are simulated together as rows of a sample matrix rather than
+    one at a time. Without final-step criteria, correlations of exactly 0 or 1
+    are answered in closed form.
+    
     Returns:
-        success_probability, fitted_model, success_counts
+        success_probability, fitted_model, success_counts (array of per-replicate
+        counts of final clones in the top X%)
     """
     real_data = np.array(real_data).flatten()
+    n_clones = len(real_data)
     
     # Validate inputs
-    if len(real_data) == 0:
+    if n_clones == 0:
         raise ValueError("No valid data provided")
     
-    if step1_keep > len(real_data):
-        raise ValueError(f"Step 1 keep ({step1_keep}) cannot exceed data size ({len(real_data)})")
+    if step1_keep > n_clones:
+        raise ValueError(f"Step 1 keep ({step1_keep}) cannot exceed data size ({n_clones})")
     
     if step2_keep > step1_keep:
         raise ValueError(f"Step 2 keep ({step2_keep}) cannot exceed step 1 keep ({step1_keep})")
@@ -73,92 +194,174 @@ def simulate_workflow(real_data, df, top_x_percent, step1_keep, step2_keep, step
         raise ValueError(f"Step 3 keep ({step3_keep}) cannot exceed step 2 keep ({step2_keep})")
     
     # Fit distribution model
-    fitted_model = fit_lognormal(real_data) if method == "lognormal" else None
+    if method == "lognormal":
+        if fitted_model is None:
+            fitted_model = fit_lognormal(real_data)
+    else:
+        fitted_model = None
+    
+    # Set the sampler up once; every replicate batch draws from it. The Monte Carlo
+    # matrices only feed rankings and a cutoff comparison, so float32 is plenty and
+    # halves the memory traffic
+    draw = _make_sampler(real_data, method, fitted_model, dtype=np.float32)
+    
+    # Calculate cutoff for top X%
+    if cutoff is None:
+        cutoff = np.percentile(real_data, 100 - top_x_percent)
+    cutoff = np.float32(cutoff)
+    
+    # Loop invariants: the criteria mask doesn't depend on the replicate, and
+    # every correlated step scales its noise by the same factor
+    # (kept as Python floats so they don't promote the float32 sample matrices)
+    criteria_ok = apply_criteria_filter(df, criteria_settings, np.arange(n_clones))
+    correlation = float(correlation)
+    noise_scale = float(np.sqrt(1.0 - correlation * correlation))
+    
+    if apply_criteria:
+        n_candidates = n_clones
+    else:
+        # Step 1 only screens clones that pass the criteria
+        n_candidates = int(np.count_nonzero(criteria_ok))
+        if n_candidates < step1_keep:
+            return 0.0, fitted_model, np.empty(0, dtype=np.intp)
+        
+        # At correlation 0 or 1 the outcome only depends on how many step-1 draws
+        # clear the cutoff, which has a closed form
+        if correlation in (0.0, 1.0):
+            p_exceed = _exceedance_probability(real_data, method, fitted_model, cutoff)
+            success_probability, success_counts = _closed_form_workflow(
+                n_candidates, step1_keep, step3_keep, p_exceed, correlation, n_rep
+            )
+            return success_probability, fitted_model, success_counts
     
     success_count = 0
     success_counts = []
     
-    # Calculate cutoff for top X%
-    cutoff = np.percentile(real_data, 100 - top_x_percent)
+    # Replicates are independent, so run them as rows of a matrix in batches
+    # that keep each (batch, n_candidates) sample block bounded in memory
+    batch_size = max(1, _REP_BATCH_ELEMENTS // n_candidates)
     
-    for rep in range(n_rep):
-        try:
-            # Step 1: Generate assay F results
-            assay_f = generate_samples(real_data, len(real_data), method, fitted_model)
-            
-            # Apply initial filtering if criteria are applied at step 1
-            if not apply_criteria:
-                filter_mask = apply_criteria_filter(df, criteria_settings, np.arange(len(df)))
-                assay_f = assay_f[filter_mask]
-                if len(assay_f) < step1_keep:
-                    continue
-            
-            # Select top clones from step 1
-            top1_idx = np.argsort(assay_f)[-step1_keep:]
-            top1_f = assay_f[top1_idx]
-            
-            # Step 2: Generate assay G results with correlation
-            noise1 = generate_samples(real_data, step1_keep, method, fitted_model)
-            assay_g = correlation * top1_f + np.sqrt(1 - correlation**2) * noise1
-            
-            if len(assay_g) < step2_keep:
-                continue
-            
-            # Select top clones from step 2
-            top2_idx = np.argsort(assay_g)[-step2_keep:]
-            top2_f = top1_f[top2_idx]
+    # One sample buffer per step, refilled by every batch
+    n_rows = min(batch_size, n_rep)
+    buf_f = np.empty((n_rows, n_candidates), dtype=np.float32)
+    buf_g = np.empty((n_rows, step1_keep), dtype=np.float32)
+    buf_h = np.empty((n_rows, step2_keep), dtype=np.float32) if workflow_steps == 3 else None
+    
+    for start in range(0, n_rep, batch_size):
+        n_batch = min(batch_size, n_rep - start)
+        # Step 1: Generate assay F results
+        assay_f = draw(None, out=buf_f[:n_batch])
+        
+        # Select top clones from step 1. Clone identities are only needed to map
+        # back to the criteria at the final step; otherwise partition the draw in
+        # place and keep a view of its top columns instead of gathering a copy
+        if apply_criteria:
+            top1_idx = _top_k(assay_f, step1_keep)
+            top1_f = np.take_along_axis(assay_f, top1_idx, axis=1)
+        else:
+            assay_f.partition(n_candidates - step1_keep, axis=1)
+            top1_f = assay_f[:, -step1_keep:]
+        
+        # Step 2: Generate assay G results with correlation
+        assay_g = _correlated_assay(top1_f, draw(None, out=buf_g[:n_batch]), correlation, noise_scale)
+        
+        # Select top clones from step 2
+        top2_idx = _top_k(assay_g, step2_keep)
+        top2_f = np.take_along_axis(top1_f, top2_idx, axis=1)
+        
+        # Step 3 (if 3-step workflow)
+        if workflow_steps == 3:
+            assay_h = _correlated_assay(top2_f, draw(None, out=buf_h[:n_batch]), correlation, noise_scale)
             
-            # Step 3 (if 3-step workflow)
+            final_idx = _top_k(assay_h, step3_keep)
+            final_scores = np.take_along_axis(top2_f, final_idx, axis=1)
+        else:
+            final_idx = _top_k(assay_g, step3_keep)
+            final_scores = np.take_along_axis(top1_f, final_idx, axis=1)
+        
+        # Count successful clones
+        batch_counts = (final_scores >= cutoff).sum(axis=1)
+        
+        # Apply criteria filtering at final step if requested; replicates whose
+        # final clones fail the criteria are discarded
+        if apply_criteria:
+            # Map back to original indices
             if workflow_steps == 3:
-                noise2 = generate_samples(real_data, step2_keep, method, fitted_model)
-                assay_h = correlation * top2_f + np.sqrt(1 - correlation**2) * noise2
-                
-                if len(assay_h) < step3_keep:
-                    continue
-                
-                final_idx = np.argsort(assay_h)[-step3_keep:]
-                final_scores = top2_f[final_idx]
+                original_indices = np.take_along_axis(
+                    top1_idx, np.take_along_axis(top2_idx, final_idx, axis=1), axis=1
+                )
             else:
-                final_idx = np.argsort(assay_g)[-step3_keep:]
-                final_scores = top1_f[final_idx]
-            
-            # Apply criteria filtering at final step if requested
-            if apply_criteria:
-                if workflow_steps == 3:
-                    # Map back to original indices
-                    original_indices = top1_idx[top2_idx[final_idx]]
-                    mask = apply_criteria_filter(df, criteria_settings, original_indices)
-                else:
-                    original_indices = top1_idx[final_idx]
-                    mask = apply_criteria_filter(df, criteria_settings, original_indices)
-                
-                if not all(mask):
-                    continue
-            
-            # Count successful clones
-            count_success = np.sum(final_scores >= cutoff)
-            success_counts.append(count_success)
-            
-            # Check if all final clones are successful
-            if count_success == step3_keep:
-                success_count += 1
-                
-        except Exception as e:
-            # Skip this iteration if there's an error
-            continue
+                original_indices = np.take_along_axis(top1_idx, final_idx, axis=1)
+            batch_counts = batch_counts[criteria_ok[original_indices].all(axis=1)]
+        
+        success_counts.append(batch_counts)
+        
+        # Check if all final clones are successful
+        success_count += int(np.count_nonzero(batch_counts == step3_keep))
     
+    success_counts = np.concatenate(success_counts) if success_counts else np.empty(0, dtype=np.intp)
     success_probability = success_count / n_rep if n_rep > 0 else 0
     return success_probability, fitted_model, success_counts
 
-def run_sensitivity_analysis(results, df, settings, correlations):
+def simulate_correlation(results, df, settings, correlation, fitted_model=None):
+    """Run simulate_workflow for one correlation value using a settings dict from the sidebar."""
+    return simulate_workflow(
+        results, df, settings["top_x_percent"], settings["step1_keep"],
+        settings["step2_keep"], settings["step3_keep"], correlation,
+        settings["n_rep"], settings["dist_method"],
+        settings["criteria_settings"], settings["apply_criteria_at_step2"],
+        settings["workflow_steps"], fitted_model
+    )
+
+def _sensitivity_point(results, df, test_settings, correlation, fitted_model, cutoff):
+    """Success probability for one sensitivity sweep point; 0 if the simulation fails."""
+    try:
+        prob, _, _ = simulate_workflow(
+            results, df, test_settings['top_x_percent'],
+            test_settings['step1_keep'], test_settings['step2_keep'],
+            test_settings['step3_keep'], correlation, 1000,  # Reduced n_rep for speed
+            test_settings['dist_method'], test_settings['criteria_settings'],
+            test_settings['apply_criteria_at_step2'], test_settings['workflow_steps'],
+            fitted_model, cutoff
+        )
+        return prob
+    except Exception as e:
+        return 0  # Default to 0 if simulation fails
+
+def _seeded_call(seed_seq, fn, args):
+    """Seed NumPy's global random state from ``seed_seq``, then return fn(*args)."""
+    np.random.seed(seed_seq.generate_state(4))
+    return fn(*args)
+
+def run_seeded_tasks(fn, tasks, random_seed=None):
+    """Run fn(*args) for each args tuple in ``tasks`` in a process pool.
+    
+    Yields (task index, result) pairs as tasks complete. Each task reseeds
+    NumPy's global random state from its own child of SeedSequence(random_seed),
+    so workers never share a random stream and a given seed reproduces the
+    same results however the tasks are scheduled.
+    """
+    seeds = np.random.SeedSequence(random_seed).spawn(len(tasks))
+    with ProcessPoolExecutor() as executor:
+        futures = {
+            executor.submit(_seeded_call, seed_seq, fn, args): i
+            for i, (seed_seq, args) in enumerate(zip(seeds, tasks))
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def run_sensitivity_analysis(results, df, settings, correlations, fitted_model=None):
     """
     Run sensitivity analysis to understand parameter effects.
     
+    The data only changes through the swept settings, so the lognormal fit
+    (``fitted_model`` if given) and the top-X% cutoffs are computed once and
+    shared by every sweep point.
+    
     Returns:
         Dictionary with sensitivity analysis results
     """
     base_settings = settings.copy()
-    sensitivity_results = {}
     
     # Parameter ranges for sensitivity analysis
     param_ranges = {
@@ -178,9 +381,8 @@ def run_sensitivity_analysis(results, df, settings, correlations):
     # Use a single correlation value for sensitivity analysis
     correlation = correlations[0] if len(correlations) > 0 else 0.5
     
+    tasks = []
     for param_name, param_values in param_ranges.items():
-        probabilities = []
-        
         for param_value in param_values:
             # Create modified settings
             test_settings = base_settings.copy()
@@ -193,22 +395,45 @@ def run_sensitivity_analysis(results, df, settings, correlations):
             elif param_name == 'step2_keep':
                 test_settings['step3_keep'] = min(test_settings['step3_keep'], param_value)
             
-            try:
-                prob, _, _ = simulate_workflow(
-                    results, df, test_settings['top_x_percent'],
-                    test_settings['step1_keep'], test_settings['step2_keep'],
-                    test_settings['step3_keep'], correlation, 1000,  # Reduced n_rep for speed
-                    test_settings['dist_method'], test_settings['criteria_settings'],
-                    test_settings['apply_criteria_at_step2'], test_settings['workflow_steps']
-                )
-                probabilities.append(prob)
-            except Exception as e:
-                probabilities.append(0)  # Default to 0 if simulation fails
-        
-        sensitivity_results[param_name] = {
-            'values': param_values,
-            'probabilities': probabilities
-        }
+            tasks.append((param_name, test_settings))
+    
+    # Shared across sweep points: the criteria columns as plain arrays (only the
+    # ones in use, which also keeps the per-task pickles small), one fit, and
+    # every distinct cutoff from one percentile call
+    criteria_arrays = {
+        col: np.asarray(df[col], dtype=np.float64)
+        for col, _, _ in base_settings['criteria_settings'] if col in df
+    }
+    if base_settings['dist_method'] == "lognormal":
+        if fitted_model is None:
+            fitted_model = fit_lognormal(results)
+    else:
+        fitted_model = None
+    top_x_values = sorted({t['top_x_percent'] for _, t in tasks})
+    cutoffs = dict(zip(top_x_values, np.percentile(results, [100 - x for x in top_x_values])))
+    task_cutoffs = [cutoffs[t['top_x_percent']] for _, t in tasks]
+    
+    # Every sweep point is an independent simulation
+    if base_settings.get('use_parallel'):
+        probabilities = [0] * len(tasks)
+        point_args = [
+            (results, criteria_arrays, test_settings, correlation, fitted_model, cutoff)
+            for (_, test_settings), cutoff in zip(tasks, task_cutoffs)
+        ]
+        for i, prob in run_seeded_tasks(_sensitivity_point, point_args, base_settings.get('random_seed')):
+            probabilities[i] = prob
+    else:
+        probabilities = [
+            _sensitivity_point(results, criteria_arrays, test_settings, correlation, fitted_model, cutoff)
+            for (_, test_settings), cutoff in zip(tasks, task_cutoffs)
+        ]
+    
+    sensitivity_results = {
+        param_name: {'values': param_values, 'probabilities': []}
+        for param_name, param_values in param_ranges.items()
+    }
+    for (param_name, _), prob in zip(tasks, probabilities):
+        sensitivity_results[param_name]['probabilities'].append(prob)
     
     return sensitivity_results
 
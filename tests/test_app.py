@@ -0,0 +1,16 @@
+import numpy as np
+import pandas as pd
+
+from app import preview_table
+
+
+def test_preview_table_handles_mixed_type_columns():
+    df = pd.DataFrame({
+        "Clone ID": [1, "C1"] * 10,
+        "Results": np.linspace(1.0, 20.0, 20),
+    })
+    
+    table = preview_table(df)
+    
+    assert table.num_rows == 10
+    assert table.column("Clone ID").to_pylist()[:2] == ["1", "C1"]
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from simulation import apply_criteria_filter, fit_lognormal, generate_samples, simulate_workflow
+
+# Synthetic assay results: 200 clones drawn from a lognormal
+REAL_DATA = np.random.default_rng(2024).lognormal(mean=4.0, sigma=0.5, size=200)
+
+
+@pytest.mark.parametrize("method", ["lognormal", "kde"])
+@pytest.mark.parametrize("workflow_steps, step1_keep, step2_keep, step3_keep", [
+    (2, 40, 20, 3),
+    (2, 40, 20, 20),
+    (3, 40, 20, 3),
+    (3, 60, 30, 20),
+])
+@pytest.mark.parametrize("exact, near", [(0.0, 1e-6), (1.0, 1 - 1e-6)])
+def test_closed_form_matches_monte_carlo(method, workflow_steps, step1_keep, step2_keep,
+                                         step3_keep, exact, near):
+    """Correlations of exactly 0 or 1 (closed form) agree with Monte Carlo just beside them."""
+    args = (REAL_DATA, {}, 10, step1_keep, step2_keep, step3_keep)
+    rest = (20000, method, [], False, workflow_steps)
+    
+    np.random.seed(0)
+    exact_prob, _, exact_counts = simulate_workflow(*args, exact, *rest)
+    np.random.seed(0)
+    mc_prob, _, mc_counts = simulate_workflow(*args, near, *rest)
+    
+    assert exact_counts.shape == mc_counts.shape == (20000,)
+    assert exact_prob == pytest.approx(mc_prob, abs=0.02)
+    assert exact_counts.mean() == pytest.approx(mc_counts.mean(), abs=0.05 * step3_keep)
+
+
+def _reference_workflow(real_data, criteria, top_x_percent, step1_keep, step2_keep, step3_keep,
+                        correlation, n_rep, criteria_settings, apply_criteria, workflow_steps, rng):
+    """One replicate at a time, with full sorts, as simulate_workflow is specified."""
+    fitted_model = fit_lognormal(real_data)
+    cutoff = np.percentile(real_data, 100 - top_x_percent)
+    criteria_ok = apply_criteria_filter(criteria, criteria_settings, np.arange(len(real_data)))
+    n_candidates = len(real_data) if apply_criteria else int(criteria_ok.sum())
+    noise_scale = np.sqrt(1 - correlation ** 2)
+    
+    def draw(size):
+        return generate_samples(real_data, size, "lognormal", fitted_model, random_state=rng)
+    
+    success_count = 0
+    success_counts = []
+    for _ in range(n_rep):
+        assay_f = draw(n_candidates)
+        top1 = np.argsort(assay_f)[-step1_keep:]
+        assay_g = correlation * assay_f[top1] + noise_scale * draw(step1_keep)
+        if workflow_steps == 3:
+            top2 = top1[np.argsort(assay_g)[-step2_keep:]]
+            assay_h = correlation * assay_f[top2] + noise_scale * draw(step2_keep)
+            final = top2[np.argsort(assay_h)[-step3_keep:]]
+        else:
+            final = top1[np.argsort(assay_g)[-step3_keep:]]
+        
+        if apply_criteria and not criteria_ok[final].all():
+            continue
+        count = int((assay_f[final] >= cutoff).sum())
+        success_counts.append(count)
+        success_count += count == step3_keep
+    
+    return success_count / n_rep, np.array(success_counts)
+
+
+# Integer-valued criterion so "=" selects a sizeable subset of the clones
+CRITERIA = {"Criteria1": np.random.default_rng(7).integers(0, 4, size=30).astype(float)}
+
+
+@pytest.mark.parametrize("workflow_steps", [2, 3])
+@pytest.mark.parametrize("criteria_settings, apply_criteria", [
+    ([], False),
+    ([("Criteria1", ">=", 1.0)], False),
+    ([("Criteria1", ">=", 1.0)], True),
+    ([("Criteria1", "<=", 2.0)], True),
+    ([("Criteria1", "=", 1.0)], True),
+])
+def test_simulate_workflow_matches_reference_loop(workflow_steps, criteria_settings, apply_criteria):
+    real_data = REAL_DATA[:30]
+    n_rep = 4000
+    args = (10, 12, 6, 2, 0.5, n_rep, criteria_settings, apply_criteria, workflow_steps)
+    
+    np.random.seed(11)
+    prob, fitted_model, counts = simulate_workflow(
+        real_data, CRITERIA, *args[:5], n_rep, "lognormal", *args[6:]
+    )
+    ref_prob, ref_counts = _reference_workflow(
+        real_data, CRITERIA, *args, np.random.default_rng(11)
+    )
+    
+    assert isinstance(prob, float) and 0.0 <= prob <= 1.0
+    assert fitted_model == pytest.approx(fit_lognormal(real_data))
+    assert counts.ndim == 1 and np.issubdtype(counts.dtype, np.integer)
+    assert counts.min() >= 0 and counts.max() <= 2
+    if apply_criteria:
+        # Replicates whose final clones fail the criteria are dropped
+        assert len(counts) < n_rep
+        assert len(counts) == pytest.approx(len(ref_counts), rel=0.1)
+    else:
+        assert len(counts) == n_rep
+    # Both are Monte Carlo estimates: allow four standard errors of their difference
+    prob_se = np.sqrt((prob * (1 - prob) + ref_prob * (1 - ref_prob)) / n_rep)
+    mean_se = np.sqrt(counts.var() / len(counts) + ref_counts.var() / len(ref_counts))
+    assert prob == pytest.approx(ref_prob, abs=4 * prob_se + 1e-3)
+    assert counts.mean() == pytest.approx(ref_counts.mean(), abs=4 * mean_se + 1e-3)